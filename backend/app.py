@@ -1,11 +1,24 @@
-from flask import Flask, render_template, jsonify, request
+# Patch blocking stdlib I/O before anything else imports socket/ssl/threading
+from gevent import monkey
+monkey.patch_all()
+# gRPC (used by the Gemini SDK) needs its own hook to cooperate with gevent
+from grpc.experimental import gevent as grpc_gevent
+grpc_gevent.init_gevent()
+
+from flask import Flask, Response, render_template, request, make_response, stream_with_context
 from flask_cors import CORS
+from cachetools import TTLCache
 from datetime import datetime
+from functools import wraps
+from zoneinfo import ZoneInfo
+import bisect
+import hashlib
+import orjson
 import os
+import threading
 from backend.config import Config
-from backend.database import Database
-from backend.scheduler import HourlyScheduler
-from backend.rag_service import RAGChatbot
+from backend.database import get_db
+from backend.rag_service import RAGChatbot, ERROR_RESPONSE, is_cacheable
 import shutil
 
 # Check if volume database exists and is populated
@@ -25,14 +38,91 @@ app = Flask(__name__,
 app.config['SECRET_KEY'] = Config.SECRET_KEY
 CORS(app)
 
+# Short-lived cache for read-only endpoints; data only changes once per hour
+_api_cache = TTLCache(maxsize=64, ttl=60)
+_api_cache_lock = threading.Lock()
+
+# Exact-match chat answer cache; similar (not identical) questions are
+# handled by the chatbot's own semantic cache
+_chat_exact = TTLCache(maxsize=1024, ttl=3600)
+_chat_cache_lock = threading.Lock()
+_chat_tz = ZoneInfo(Config.TIMEZONE)
+
+def clear_api_cache():
+    """Drop all cached API and chat responses (called after each scheduler cycle)"""
+    with _api_cache_lock:
+        _api_cache.clear()
+    with _chat_cache_lock:
+        _chat_exact.clear()
+    chatbot.semantic_cache.clear()
+
+def _chat_key(message: str) -> str:
+    """
+    Hash a chat message after lowercasing and collapsing whitespace.
+    The current hour is part of the key, so answers expire with the hourly data
+    even when no scheduler runs in this process to clear the cache.
+    """
+    bucket = datetime.now(_chat_tz).strftime('%Y-%m-%d %H')
+    normalized = ' '.join(message.lower().split())
+    return hashlib.sha256(f"{bucket}|{normalized}".encode()).hexdigest()
+
+def cached_response(view):
+    """Serve identical GET requests from the TTL cache instead of hitting SQLite"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = (request.path, request.query_string)
+        with _api_cache_lock:
+            cached = _api_cache.get(key)
+        if cached is not None:
+            body, status, headers = cached
+            response = app.response_class(body, status=status, headers=headers, mimetype='application/json')
+            return response.make_conditional(request)
+        
+        response = make_response(view(*args, **kwargs))
+        # Only successful responses are cached so errors are retried on the next poll
+        if response.status_code == 200:
+            headers = [(k, v) for k, v in response.headers if k in ('ETag', 'Cache-Control')]
+            with _api_cache_lock:
+                _api_cache[key] = (response.get_data(), response.status_code, headers)
+        return response
+    return wrapper
+
+def ojson(obj, status: int = 200) -> Response:
+    """Serialize obj with orjson (C implementation) into a JSON response"""
+    return Response(orjson.dumps(obj), status=status, mimetype='application/json')
+
+def _make_etag(*parts) -> str:
+    """Build an ETag from the values that determine a response body"""
+    return hashlib.md5('|'.join(str(p) for p in parts).encode()).hexdigest()
+
+def _not_modified(etag: str):
+    """Return a 304 response if the client already has this ETag, else None"""
+    if request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304)
+        response.set_etag(etag, weak=True)
+        return response
+    return None
+
+def _with_etag(response, etag: str):
+    """Attach ETag and Cache-Control headers to a JSON response"""
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'public, max-age=60'
+    return response
+
 # Initialize services
-db = Database()
+db = get_db()
 db.init_schema()
 chatbot = RAGChatbot(db)
-scheduler = HourlyScheduler()
 
-# Start scheduler
-scheduler.start()
+# Start scheduler only where enabled, so multi-worker deployments load the model once
+scheduler = None
+if Config.ENABLE_SCHEDULER:
+    # Imported lazily: pulls in TensorFlow, which web-only workers don't need
+    from backend.scheduler import HourlyScheduler
+    scheduler = HourlyScheduler(db, on_update=clear_api_cache)
+    scheduler.start()
+else:
+    print("[INFO] Scheduler disabled in this process (ENABLE_SCHEDULER != 1)")
 
 # Run initial task if database is empty
 if db.get_measurement_count() == 0:
@@ -40,12 +130,17 @@ if db.get_measurement_count() == 0:
     print("       python backend/init_db.py --csv path/to/your/historical_data.csv")
     exit(1)
 
+# PM2.5 status bands: values <= threshold[i] map to label[i]
+STATUS_THRESHOLDS = (12, 35, 55)
+STATUS_LABELS = ('Good', 'Moderate', 'Unhealthy for Sensitive', 'Unhealthy')
+
 @app.route('/')
 def index():
     """Serve main dashboard"""
     return render_template('index.html')
 
 @app.route('/api/current')
+@cached_response
 def api_current():
     """
     Get current PM2.5 measurement and next-hour prediction.
@@ -59,29 +154,17 @@ def api_current():
         }
     """
     try:
-        # Get latest measurement
-        latest = db.get_last_n_hours(1)
-        if not latest:
-            return jsonify({'error': 'No data available'}), 404
+        # Latest measurement + next-hour prediction in a single round-trip
+        snapshot = db.get_current_snapshot()
+        if not snapshot:
+            return ojson({'error': 'No data available'}, 404)
         
-        current_pm25 = latest[0]['pm25']
-        current_datetime = latest[0]['datetime']
+        current_pm25 = snapshot['pm25']
+        current_datetime = snapshot['datetime']
+        next_hour_pred = snapshot['next_pred']
+        status = STATUS_LABELS[bisect.bisect_left(STATUS_THRESHOLDS, current_pm25)]
         
-        # Get predictions
-        predictions = db.get_latest_predictions()
-        next_hour_pred = predictions[0]['predicted_pm25'] if predictions else None
-        
-        # Determine status
-        if current_pm25 <= 12:
-            status = "Good"
-        elif current_pm25 <= 35:
-            status = "Moderate"
-        elif current_pm25 <= 55:
-            status = "Unhealthy for Sensitive"
-        else:
-            status = "Unhealthy"
-        
-        return jsonify({
+        return ojson({
             'datetime': current_datetime,
             'current_pm25': current_pm25,
             'next_hour_prediction': next_hour_pred,
@@ -89,9 +172,10 @@ def api_current():
         })
     
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return ojson({'error': str(e)}, 500)
 
 @app.route('/api/predictions')
+@cached_response
 def api_predictions():
     """
     Get 24-hour predictions.
@@ -105,11 +189,16 @@ def api_predictions():
         }
     """
     try:
+        etag = _make_etag(db.get_latest_prediction_time())
+        not_modified = _not_modified(etag)
+        if not_modified:
+            return not_modified
+        
         predictions = db.get_latest_predictions()
-        return jsonify({'predictions': predictions})
+        return _with_etag(ojson({'predictions': predictions}), etag)
     
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return ojson({'error': str(e)}, 500)
 
 @app.route('/api/history')
 def api_history():
@@ -131,11 +220,16 @@ def api_history():
         hours = request.args.get('hours', default=168, type=int)
         hours = min(hours, 720)  # Max 30 days
         
+        etag = _make_etag(db.get_latest_datetime(), hours)
+        not_modified = _not_modified(etag)
+        if not_modified:
+            return not_modified
+        
         history = db.get_last_n_hours(hours)
-        return jsonify({'history': history})
+        return _with_etag(ojson({'history': history}), etag)
     
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return ojson({'error': str(e)}, 500)
 
 @app.route('/api/chat', methods=['POST'])
 def api_chat():
@@ -153,17 +247,79 @@ def api_chat():
         user_message = data.get('message', '')
         
         if not user_message:
-            return jsonify({'error': 'No message provided'}), 400
+            return ojson({'error': 'No message provided'}, 400)
+        
+        # Exact match on the normalized message skips even the embedding call
+        key = _chat_key(user_message)
+        with _chat_cache_lock:
+            cached = _chat_exact.get(key)
+        if cached is not None:
+            return ojson({'response': cached})
         
-        # Get response from RAG chatbot
+        # Get response from RAG chatbot (semantic cache lives inside)
         response = chatbot.query_data(user_message)
+        if is_cacheable(response):
+            with _chat_cache_lock:
+                _chat_exact[key] = response
+        
+        return ojson({'response': response})
+    
+    except Exception as e:
+        return ojson({'error': str(e)}, 500)
+
+@app.route('/api/chat/stream', methods=['POST'])
+def api_chat_stream():
+    """
+    Streaming chatbot endpoint; same request body as /api/chat.
+    
+    Returns:
+        text/plain body written chunk by chunk as Gemini generates it
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        user_message = data.get('message', '')
+        
+        if not user_message:
+            return ojson({'error': 'No message provided'}, 400)
         
-        return jsonify({'response': response})
+        key = _chat_key(user_message)
+        with _chat_cache_lock:
+            cached = _chat_exact.get(key)
+        if cached is not None:
+            return Response(cached, mimetype='text/plain')
+        
+        # Pull the first chunk before responding, so failures in the fast routes or the
+        # semantic cache lookup still surface as a JSON 500 rather than a cut-off 200 body
+        stream = chatbot.query_data_stream(user_message)
+        first = next(stream, '')
     
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return ojson({'error': str(e)}, 500)
+    
+    def generate():
+        chunks = [first]
+        yield first
+        try:
+            for chunk in stream:
+                chunks.append(chunk)
+                yield chunk
+        except Exception as e:
+            # Headers are already sent; finish the body with the canned error instead
+            print(f"[ERROR] Chat stream failed: {e}")
+            yield ("\n\n" if any(chunks) else "") + ERROR_RESPONSE
+            return
+        
+        response = ''.join(chunks)
+        if is_cacheable(response):
+            with _chat_cache_lock:
+                _chat_exact[key] = response
+    
+    # X-Accel-Buffering stops reverse proxies from holding the chunks back
+    return Response(stream_with_context(generate()), mimetype='text/plain',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 @app.route('/api/stats')
+@cached_response
 def api_stats():
     """
     Get database statistics.
@@ -180,16 +336,21 @@ def api_stats():
         latest = db.get_latest_datetime()
         predictions = db.get_latest_predictions()
         
-        return jsonify({
+        return ojson({
             'total_measurements': count,
             'latest_datetime': latest,
             'prediction_count': len(predictions)
         })
     
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return ojson({'error': str(e)}, 500)
 
 if __name__ == '__main__':
     port = Config.PORT
-    print(f"\n🚀 Starting Flask app on port {port}...")
-    app.run(host='0.0.0.0', port=port, debug=(Config.FLASK_ENV == 'development'))
\ No newline at end of file
+    if Config.FLASK_ENV == 'development':
+        print(f"\n🚀 Starting Flask dev server on port {port}...")
+        app.run(host='0.0.0.0', port=port, debug=True)
+    else:
+        from gevent.pywsgi import WSGIServer
+        print(f"\n🚀 Starting gevent WSGI server on port {port}...")
+        WSGIServer(('0.0.0.0', port), app).serve_forever()
\ No newline at end of file
@@ -0,0 +1,33 @@
+from typing import Any, Callable
+
+def gevent_patched() -> bool:
+    """True when gevent has monkey-patched threading (the web process)"""
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    return monkey.is_module_patched('threading')
+
+def run_blocking(fn: Callable, *args) -> Any:
+    """
+    Call fn on a native OS thread when running under gevent, otherwise inline.
+
+    Patched threads are greenlets, so SQLite calls (never patched) and TF inference
+    would stall every request on the hub; the hub's threadpool runs them in parallel
+    while only the calling greenlet waits.
+    """
+    if gevent_patched():
+        import gevent
+        return gevent.get_hub().threadpool.apply(fn, args)
+    return fn(*args)
+
+def native_executor(max_workers: int):
+    """
+    ThreadPoolExecutor whose workers are real OS threads even under gevent
+    (the patched concurrent.futures pool would run them one greenlet at a time).
+    """
+    if gevent_patched():
+        from gevent.threadpool import ThreadPoolExecutor
+    else:
+        from concurrent.futures import ThreadPoolExecutor
+    return ThreadPoolExecutor(max_workers=max_workers)
@@ -15,6 +15,7 @@ class Config:
     # Paths
     DATABASE_PATH = os.getenv('DATABASE_PATH', './data/pm25_data.db')
     MODEL_PATH = os.getenv('MODEL_PATH', './models/best_model.keras')
+    TFLITE_MODEL_PATH = os.getenv('TFLITE_MODEL_PATH', './models/model.tflite')
     
     # PM2.5 Monitoring Site
     SITE_NAME = os.getenv('SITE_NAME', '土城')
@@ -26,6 +27,10 @@ class Config:
     SEQUENCE_LENGTH = 720  # 30 days * 24 hours
     PREDICTION_HOURS = 24
     
+    # Scheduler: set ENABLE_SCHEDULER=0 on web workers when a separate
+    # `python -m backend.scheduler_worker` process runs the hourly job
+    ENABLE_SCHEDULER = os.getenv('ENABLE_SCHEDULER', '1') == '1'
+    
     # Timezone
     TIMEZONE = os.getenv('TZ', 'Asia/Taipei')
     
@@ -0,0 +1,69 @@
+"""
+Convert the trained Keras model to TFLite for cheaper inference.
+Run this ONCE after training; PredictionService picks up the .tflite file automatically.
+
+Usage:
+    python -m backend.convert_model
+    python -m backend.convert_model --keras models/best_model.keras --out models/model.tflite
+    python -m backend.convert_model --scaler-min 0 --scaler-max 250
+"""
+
+import argparse
+import json
+import os
+import tensorflow as tf
+from backend.config import Config
+
+def convert_to_tflite(keras_path: str, tflite_path: str):
+    """
+    Convert a Keras model to a quantized TFLite flatbuffer.
+    
+    Args:
+        keras_path: Path to the trained .keras model
+        tflite_path: Output path for the .tflite model
+    """
+    print("\n" + "="*60)
+    print("🔧 KERAS → TFLITE CONVERSION")
+    print("="*60)
+    
+    print(f"📦 Loading Keras model: {keras_path}")
+    model = tf.keras.models.load_model(keras_path)
+    
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    # Recurrent/attention layers may need TF ops not covered by the builtin set
+    converter.target_spec.supported_ops = [
+        tf.lite.OpsSet.TFLITE_BUILTINS,
+        tf.lite.OpsSet.SELECT_TF_OPS
+    ]
+    tflite_model = converter.convert()
+    
+    with open(tflite_path, 'wb') as f:
+        f.write(tflite_model)
+    
+    print(f"✅ Saved TFLite model: {tflite_path}")
+    print(f"   Keras size:  {os.path.getsize(keras_path) / 1024 / 1024:.2f} MB")
+    print(f"   TFLite size: {os.path.getsize(tflite_path) / 1024 / 1024:.2f} MB")
+    print("="*60 + "\n")
+
+def save_scaler_params(min_val: float, max_val: float, keras_path: str):
+    """
+    Save the training-set min/max to scaler.json next to the Keras model.
+    PredictionService uses these instead of fitting min/max per window.
+    """
+    scaler_path = os.path.join(os.path.dirname(keras_path), 'scaler.json')
+    with open(scaler_path, 'w') as f:
+        json.dump({'min': min_val, 'max': max_val}, f)
+    print(f"✅ Saved scaler params: {scaler_path} (min={min_val}, max={max_val})")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Convert the Keras PM2.5 model to TFLite')
+    parser.add_argument('--keras', default=Config.MODEL_PATH, help='Path to the .keras model')
+    parser.add_argument('--out', default=Config.TFLITE_MODEL_PATH, help='Output .tflite path')
+    parser.add_argument('--scaler-min', type=float, help='Training-set PM2.5 min (writes scaler.json)')
+    parser.add_argument('--scaler-max', type=float, help='Training-set PM2.5 max (writes scaler.json)')
+    
+    args = parser.parse_args()
+    convert_to_tflite(args.keras, args.out)
+    if args.scaler_min is not None and args.scaler_max is not None:
+        save_scaler_params(args.scaler_min, args.scaler_max, args.keras)
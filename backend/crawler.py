@@ -1,16 +1,26 @@
+import ijson
 import requests
+from operator import itemgetter
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional
 from backend.config import Config
-from backend.database import Database
+from backend.database import Database, get_db
 
 class EPACrawler:
     def __init__(self, db: Database = None):
         self.api_url = Config.EPA_API_URL
         self.api_key = Config.EPA_API_KEY
         self.site_name = Config.SITE_NAME
-        self.db = db or Database()
+        self.db = db or get_db()
         self.last_valid_pm25 = None
+        
+        # Persistent session so hourly crawls reuse the TLS connection
+        self.session = requests.Session()
+        self.session.headers.update({'Accept-Encoding': 'gzip'})
+        retry = Retry(total=3, backoff_factor=0.5, status_forcelist=[502, 503, 504])
+        self.session.mount('https://', HTTPAdapter(pool_connections=2, pool_maxsize=4, max_retries=retry))
     
     def clean_pm25_value(self, raw_value) -> Optional[float]:
         """
@@ -37,16 +47,17 @@ class EPACrawler:
             }
             
             print(f"📡 Fetching data from EPA API...")
-            response = requests.get(self.api_url, params=params, timeout=30)
-            response.raise_for_status()
-            
-            data = response.json()
-            records = data.get('records', [])
-            
-            # Filter for PM2.5 items and target site
             site_data = []
-            for record in records:
-                if record.get('itemengname') == 'PM2.5' and record.get('sitename') == self.site_name:
+            with self.session.get(self.api_url, params=params, stream=True, timeout=30) as response:
+                response.raise_for_status()
+                # Let urllib3 undo gzip so ijson sees plain JSON bytes
+                response.raw.decode_content = True
+                
+                # Stream records one at a time, keeping only PM2.5 for the target site
+                for record in ijson.items(response.raw, 'records.item'):
+                    if record.get('itemengname') != 'PM2.5' or record.get('sitename') != self.site_name:
+                        continue
+                    
                     datetime_str = record.get('monitordate', '')  # Format: "2025-11-21 14:00"
                     pm25_raw = record.get('concentration', '')
                     
@@ -81,11 +92,11 @@ class EPACrawler:
         if not data:
             return data
         
-        # Sort by datetime
-        data_sorted = sorted(data, key=lambda x: x['datetime'])
+        # Sort in place by datetime (C-level key extractor, no copy)
+        data.sort(key=itemgetter('datetime'))
         
         filled_data = []
-        for record in data_sorted:
+        for record in data:
             if record['pm25'] is None or record['pm25'] == '':
                 if self.last_valid_pm25 is not None:
                     print(f"[DEBUG] Forward-fill at {record['datetime']}: using {self.last_valid_pm25}")
@@ -105,7 +116,7 @@ class EPACrawler:
         Main crawler function:
         1. Fetch latest data from EPA API
         2. Clean and forward-fill missing values
-        3. Store in database
+        3. Store records newer than the latest stored hour
         """
         print("\n" + "="*60)
         print(f"🕐 CRAWLER START: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
@@ -121,10 +132,16 @@ class EPACrawler:
         last_records = self.db.get_last_n_hours(1)
         if last_records:
             self.last_valid_pm25 = last_records[0]['pm25']
+        latest_dt = last_records[0]['datetime'] if last_records else ''
         
         # Apply forward-fill
         filled_data = self.forward_fill(raw_data)
         
+        # Keep only hours newer than what is already stored
+        filled_data = [r for r in filled_data if r['datetime'] > latest_dt]
+        if not filled_data:
+            print(f"[INFO] No new records since {latest_dt}, skipping insert")
+        
         # Store in database
         if filled_data:
             bulk_data = [
@@ -138,7 +155,6 @@ class EPACrawler:
             ]
             self.db.insert_measurements_bulk(bulk_data)
             print(f"✅ Crawled and Stored {len(bulk_data)} measurements")
-            print(f"[INFO] Current total measurements in DB: {self.db.get_measurement_count()}")
             print(f"[INFO] Latest measurement datetime: {self.db.get_latest_datetime()}")
             print(f"[INFO] Current Predictions count: {len(self.db.get_latest_predictions())}")
         
@@ -1,178 +1,286 @@
 import sqlite3
 import os
-from datetime import datetime
+import queue
+import threading
+import numpy as np
+from contextlib import closing, contextmanager
+from datetime import datetime, timedelta
 from typing import List, Dict, Optional
 from backend.config import Config
 
+_db_instance = None
+_db_lock = threading.Lock()
+
+def get_db() -> 'Database':
+    """Get the process-wide shared Database (one connection pool per process)"""
+    global _db_instance
+    if _db_instance is None:
+        with _db_lock:
+            if _db_instance is None:
+                _db_instance = Database()
+    return _db_instance
+
 class Database:
-    def __init__(self, db_path: str = None):
+    def __init__(self, db_path: str = None, pool_size: int = 4):
         self.db_path = db_path or Config.DATABASE_PATH
         self._ensure_db_exists()
-    
+        # Reusable connections shared by Flask workers and the scheduler thread
+        self._pool = queue.Queue(maxsize=pool_size)
+
     def _ensure_db_exists(self):
         """Create database directory if not exists"""
         os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
-    
+
+    def _init_conn(self, conn: sqlite3.Connection):
+        """Apply per-connection PRAGMAs once, when the connection is opened"""
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA cache_size=-20000')
+        conn.execute('PRAGMA temp_store=MEMORY')
+
     def _get_connection(self):
-        """Get database connection"""
-        return sqlite3.connect(self.db_path)
-    
+        """Open a new database connection (autocommit, shareable across threads)"""
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        self._init_conn(conn)
+        return conn
+
+    @contextmanager
+    def _conn(self):
+        """Borrow a pooled connection, opening a new one if the pool is empty"""
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            conn = self._get_connection()
+        try:
+            yield conn
+        finally:
+            self._release(conn)
+
+    def _release(self, conn: sqlite3.Connection):
+        """Return a connection to the pool, rolling back any transaction left open"""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            self._pool.put_nowait(conn)
+        except (sqlite3.Error, queue.Full):
+            conn.close()
+
+    @contextmanager
+    def _transaction(self):
+        """Borrow a pooled connection wrapped in an explicit BEGIN/COMMIT"""
+        with self._conn() as conn:
+            conn.execute('BEGIN')
+            try:
+                yield conn
+            except BaseException:
+                # Also covers gevent.Timeout / GreenletExit / KeyboardInterrupt
+                conn.execute('ROLLBACK')
+                raise
+            conn.execute('COMMIT')
+
     def init_schema(self):
         """Initialize database schema"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
-        
-        # Table 1: Historical measurements
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS measurements (
-                datetime TEXT PRIMARY KEY,
-                pm25 REAL NOT NULL,
-                sitename TEXT NOT NULL,
-                source TEXT NOT NULL
-            )
-        ''')
-        
-        # Table 2: Model predictions
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS predictions (
-                prediction_time TEXT NOT NULL,
-                target_datetime TEXT NOT NULL,
-                predicted_pm25 REAL NOT NULL,
-                PRIMARY KEY (prediction_time, target_datetime)
-            )
-        ''')
-        
-        # Create indexes for fast queries
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_datetime ON measurements(datetime DESC)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_pred_time ON predictions(prediction_time DESC)')
-        
-        conn.commit()
-        conn.close()
+        with self._transaction() as conn:
+            # Table 1: Historical measurements
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS measurements (
+                    datetime TEXT PRIMARY KEY,
+                    pm25 REAL NOT NULL,
+                    sitename TEXT NOT NULL,
+                    source TEXT NOT NULL
+                )
+            ''')
+
+            # Table 2: Model predictions
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS predictions (
+                    prediction_time TEXT NOT NULL,
+                    target_datetime TEXT NOT NULL,
+                    predicted_pm25 REAL NOT NULL,
+                    PRIMARY KEY (prediction_time, target_datetime)
+                )
+            ''')
+
+            # Create covering indexes so the hot read paths never touch the table rows;
+            # they replace the single-column indexes, which share their leading column
+            conn.execute('DROP INDEX IF EXISTS idx_datetime')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_dt_cover ON measurements(datetime DESC, pm25, sitename)')
+            conn.execute('DROP INDEX IF EXISTS idx_pred_time')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_pred_cover ON predictions(prediction_time DESC, target_datetime, predicted_pm25)')
+
         print("✅ Database schema initialized")
-    
+
     def insert_measurement(self, datetime_str: str, pm25: float, sitename: str, source: str = 'crawler'):
         """Insert single measurement"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
         try:
-            cursor.execute('''
-                INSERT OR REPLACE INTO measurements (datetime, pm25, sitename, source)
-                VALUES (?, ?, ?, ?)
-            ''', (datetime_str, pm25, sitename, source))
-            conn.commit()
+            with self._conn() as conn:
+                conn.execute('''
+                    INSERT OR REPLACE INTO measurements (datetime, pm25, sitename, source)
+                    VALUES (?, ?, ?, ?)
+                ''', (datetime_str, pm25, sitename, source))
         except Exception as e:
             print(f"[ERROR] Failed to insert measurement: {e}")
-        finally:
-            conn.close()
-    
+
     def insert_measurements_bulk(self, data: List[Dict]):
         """Insert multiple measurements"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
         try:
-            cursor.executemany('''
-                INSERT OR REPLACE INTO measurements (datetime, pm25, sitename, source)
-                VALUES (:datetime, :pm25, :sitename, :source)
-            ''', data)
-            conn.commit()
+            with self._transaction() as conn:
+                conn.executemany('''
+                    INSERT OR REPLACE INTO measurements (datetime, pm25, sitename, source)
+                    VALUES (:datetime, :pm25, :sitename, :source)
+                ''', data)
             print(f"✅ Inserted {len(data)} measurements")
         except Exception as e:
             print(f"[ERROR] Bulk insert failed: {e}")
-        finally:
-            conn.close()
-    
+
+    def insert_measurements_bulk_fast(self, data: List[Dict]):
+        """
+        Insert a large batch of measurements in one transaction.
+        Durability is relaxed while loading, so use this for the initial import only.
+        """
+        # Dedicated connection so the relaxed PRAGMAs never leak into the pool
+        with closing(self._get_connection()) as conn:
+            try:
+                # Stay in WAL: switching journal_mode fails while pooled connections are open
+                conn.execute('PRAGMA synchronous=OFF')
+                conn.execute('BEGIN')
+                conn.executemany('''
+                    INSERT OR REPLACE INTO measurements (datetime, pm25, sitename, source)
+                    VALUES (:datetime, :pm25, :sitename, :source)
+                ''', data)
+                conn.execute('COMMIT')
+                print(f"✅ Inserted {len(data)} measurements")
+            except Exception as e:
+                if conn.in_transaction:
+                    conn.execute('ROLLBACK')
+                print(f"[ERROR] Bulk insert failed: {e}")
+
     def get_latest_datetime(self) -> Optional[str]:
         """Get the most recent datetime in database"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT MAX(datetime) FROM measurements')
-        result = cursor.fetchone()
-        conn.close()
+        with self._conn() as conn:
+            result = conn.execute('SELECT MAX(datetime) FROM measurements').fetchone()
         return result[0] if result[0] else None
-    
+
     def get_last_n_hours(self, n: int = 720) -> List[Dict]:
         """Get last N hours of data, ordered by datetime ASC"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT datetime, pm25, sitename
-            FROM measurements
-            ORDER BY datetime DESC
-            LIMIT ?
-        ''', (n,))
-        rows = cursor.fetchall()
-        conn.close()
-        
-        # Reverse to get chronological order (oldest first)
-        rows.reverse()
-        return [{'datetime': r[0], 'pm25': r[1], 'sitename': r[2]} for r in rows]
-    
+        # Inner query picks the newest N rows; outer query returns them oldest first
+        with self._conn() as conn:
+            rows = conn.execute('''
+                SELECT datetime, pm25, sitename
+                FROM (
+                    SELECT datetime, pm25, sitename
+                    FROM measurements
+                    ORDER BY datetime DESC
+                    LIMIT ?
+                )
+                ORDER BY datetime ASC
+            ''', (n,)).fetchall()
+        return [dict(r) for r in rows]
+
+    def get_last_n_hours_pm25(self, n: int = 720) -> np.ndarray:
+        """Get last N hours of PM2.5 values as a float32 array, ordered by datetime ASC"""
+        with self._conn() as conn:
+            cur = conn.execute('''
+                SELECT pm25
+                FROM (
+                    SELECT datetime, pm25
+                    FROM measurements
+                    ORDER BY datetime DESC
+                    LIMIT ?
+                )
+                ORDER BY datetime ASC
+            ''', (n,))
+            return np.fromiter((r[0] for r in cur), dtype=np.float32)
+
+    def get_pm25_after(self, datetime_str: str, limit: int = 720) -> List[tuple]:
+        """Get up to `limit` (datetime, pm25) rows newer than datetime_str, ordered ASC"""
+        with self._conn() as conn:
+            rows = conn.execute('''
+                SELECT datetime, pm25
+                FROM measurements
+                WHERE datetime > ?
+                ORDER BY datetime ASC
+                LIMIT ?
+            ''', (datetime_str, limit)).fetchall()
+        return [(r[0], r[1]) for r in rows]
+
     def get_measurement_count(self) -> int:
         """Get total number of measurements"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT COUNT(*) FROM measurements')
-        count = cursor.fetchone()[0]
-        conn.close()
-        return count
-    
+        with self._conn() as conn:
+            return conn.execute('SELECT COUNT(*) FROM measurements').fetchone()[0]
+
+    def has_at_least(self, n: int) -> bool:
+        """Check for at least N measurements without counting the whole table"""
+        if n <= 0:
+            return True
+        with self._conn() as conn:
+            row = conn.execute('SELECT 1 FROM measurements LIMIT 1 OFFSET ?', (n - 1,)).fetchone()
+        return row is not None
+
     def cleanup_old_data(self, keep_hours: int = 720):
         """
         DISABLED: Keep all historical data for RAG queries.
         This method is kept for backward compatibility but does nothing.
         """
         pass  # No cleanup - preserve all historical data
-    
+
     def insert_predictions(self, prediction_time: str, predictions: List[Dict]):
         """Insert model predictions"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
         try:
             data = [(prediction_time, p['target_datetime'], p['predicted_pm25']) for p in predictions]
-            cursor.executemany('''
-                INSERT OR REPLACE INTO predictions (prediction_time, target_datetime, predicted_pm25)
-                VALUES (?, ?, ?)
-            ''', data)
-            conn.commit()
+            with self._transaction() as conn:
+                conn.executemany('''
+                    INSERT OR REPLACE INTO predictions (prediction_time, target_datetime, predicted_pm25)
+                    VALUES (?, ?, ?)
+                ''', data)
             print(f"✅ Stored {len(predictions)} predictions")
         except Exception as e:
             print(f"[ERROR] Failed to insert predictions: {e}")
-        finally:
-            conn.close()
-    
+
+    def get_latest_prediction_time(self) -> Optional[str]:
+        """Get the most recent prediction run timestamp"""
+        with self._conn() as conn:
+            result = conn.execute('SELECT MAX(prediction_time) FROM predictions').fetchone()
+        return result[0] if result[0] else None
+
+    def predictions_exist_for(self, hour_bucket: datetime) -> bool:
+        """Check whether a prediction run happened within the given hour"""
+        start = hour_bucket.strftime('%Y-%m-%d %H:00:00')
+        end = (hour_bucket + timedelta(hours=1)).strftime('%Y-%m-%d %H:00:00')
+        with self._conn() as conn:
+            row = conn.execute('''
+                SELECT 1
+                FROM predictions
+                WHERE prediction_time >= ? AND prediction_time < ?
+                LIMIT 1
+            ''', (start, end)).fetchone()
+        return row is not None
+
     def get_latest_predictions(self) -> List[Dict]:
         """Get the most recent 24-hour predictions"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT target_datetime, predicted_pm25
-            FROM predictions
-            WHERE prediction_time = (SELECT MAX(prediction_time) FROM predictions)
-            ORDER BY target_datetime ASC
-        ''')
-        rows = cursor.fetchall()
-        conn.close()
+        with self._conn() as conn:
+            rows = conn.execute('''
+                SELECT target_datetime, predicted_pm25
+                FROM predictions
+                WHERE prediction_time = (SELECT MAX(prediction_time) FROM predictions)
+                ORDER BY target_datetime ASC
+            ''').fetchall()
         return [{'target_datetime': r[0], 'predicted_pm25': r[1]} for r in rows]
-    
-    def query_date_range(self, start_date: str, end_date: str) -> Dict:
-        """
-        Query PM2.5 statistics for a specific date range.
-        Returns avg, min, max, count.
-        """
-        conn = self._get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT 
-                AVG(pm25) as avg_pm25,
-                MIN(pm25) as min_pm25,
-                MAX(pm25) as max_pm25,
-                COUNT(*) as count
-            FROM measurements
-            WHERE datetime BETWEEN ? AND ?
-        ''', (start_date, end_date))
-        row = cursor.fetchone()
-        conn.close()
-        
+
+    def _range_stats(self, where: str, start_date: str, end_date: str) -> Dict:
+        """Run the avg/min/max/count aggregate over measurements matching `where`"""
+        with self._conn() as conn:
+            row = conn.execute(f'''
+                SELECT
+                    AVG(pm25) as avg_pm25,
+                    MIN(pm25) as min_pm25,
+                    MAX(pm25) as max_pm25,
+                    COUNT(*) as count
+                FROM measurements
+                WHERE {where}
+            ''', (start_date, end_date)).fetchone()
+
         if row and row[3] > 0:
             return {
                 'start_date': start_date,
@@ -183,19 +291,55 @@ class Database:
                 'count': row[3]
             }
         return None
-    
+
+    def get_current_snapshot(self) -> Optional[Dict]:
+        """Get the latest measurement and the next-hour prediction in one query"""
+        with self._conn() as conn:
+            row = conn.execute('''
+                SELECT
+                    m.datetime,
+                    m.pm25,
+                    (SELECT predicted_pm25
+                     FROM predictions
+                     WHERE prediction_time = (SELECT MAX(prediction_time) FROM predictions)
+                     ORDER BY target_datetime ASC
+                     LIMIT 1) AS next_pred
+                FROM measurements m
+                ORDER BY m.datetime DESC
+                LIMIT 1
+            ''').fetchone()
+
+        if row:
+            return {
+                'datetime': row[0],
+                'pm25': row[1],
+                'next_pred': row[2]
+            }
+        return None
+
+    def query_date_range(self, start_date: str, end_date: str) -> Dict:
+        """
+        Query PM2.5 statistics for a specific date range.
+        Returns avg, min, max, count.
+        """
+        return self._range_stats('datetime BETWEEN ? AND ?', start_date, end_date)
+
+    def query_date_range_half_open(self, start_date: str, end_date: str) -> Dict:
+        """
+        Query PM2.5 statistics for [start_date, end_date).
+        Same result shape as query_date_range.
+        """
+        return self._range_stats('datetime >= ? AND datetime < ?', start_date, end_date)
+
     def query_exact_datetime(self, datetime_str: str) -> Dict:
         """Query exact PM2.5 value at specific datetime"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT pm25, sitename
-            FROM measurements
-            WHERE datetime = ?
-        ''', (datetime_str,))
-        row = cursor.fetchone()
-        conn.close()
-        
+        with self._conn() as conn:
+            row = conn.execute('''
+                SELECT pm25, sitename
+                FROM measurements
+                WHERE datetime = ?
+            ''', (datetime_str,)).fetchone()
+
         if row:
             return {
                 'datetime': datetime_str,
@@ -203,25 +347,22 @@ class Database:
                 'sitename': row[1]
             }
         return None
-    
+
     def query_worst_day(self, start_date: str, end_date: str) -> Dict:
         """Find the day with highest average PM2.5"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT 
-                DATE(datetime) as day,
-                AVG(pm25) as avg_pm25,
-                MAX(pm25) as max_pm25
-            FROM measurements
-            WHERE datetime BETWEEN ? AND ?
-            GROUP BY DATE(datetime)
-            ORDER BY avg_pm25 DESC
-            LIMIT 1
-        ''', (start_date, end_date))
-        row = cursor.fetchone()
-        conn.close()
-        
+        with self._conn() as conn:
+            row = conn.execute('''
+                SELECT
+                    DATE(datetime) as day,
+                    AVG(pm25) as avg_pm25,
+                    MAX(pm25) as max_pm25
+                FROM measurements
+                WHERE datetime BETWEEN ? AND ?
+                GROUP BY DATE(datetime)
+                ORDER BY avg_pm25 DESC
+                LIMIT 1
+            ''', (start_date, end_date)).fetchone()
+
         if row:
             return {
                 'date': row[0],
@@ -229,24 +370,23 @@ class Database:
                 'max_pm25': round(row[2], 2)
             }
         return None
-    
+
     def query_monthly_average(self, year: int, month: int) -> Dict:
         """Get monthly average PM2.5"""
         start_date = f"{year}-{month:02d}-01 00:00"
-        end_date = f"{year}-{month:02d}-31 23:59"
-        return self.query_date_range(start_date, end_date)
-    
+        # Half-open upper bound: first hour of the following month
+        next_year, next_month = (year + 1, 1) if month == 12 else (year, month + 1)
+        end_date = f"{next_year}-{next_month:02d}-01 00:00"
+        return self.query_date_range_half_open(start_date, end_date)
+
     def get_data_range(self) -> Dict:
         """Get the available data range in database"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT MIN(datetime), MAX(datetime) FROM measurements')
-        row = cursor.fetchone()
-        conn.close()
-        
+        with self._conn() as conn:
+            row = conn.execute('SELECT MIN(datetime), MAX(datetime) FROM measurements').fetchone()
+
         if row:
             return {
                 'earliest': row[0],
                 'latest': row[1]
             }
-        return None
\ No newline at end of file
+        return None
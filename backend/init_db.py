@@ -9,7 +9,7 @@ Usage:
 import pandas as pd
 import argparse
 from datetime import datetime
-from backend.database import Database
+from backend.database import get_db
 from backend.config import Config
 
 def init_from_csv(csv_path: str):
@@ -25,7 +25,7 @@ def init_from_csv(csv_path: str):
     print("="*60)
     
     # Initialize database
-    db = Database()
+    db = get_db()
     db.init_schema()
     
     # Read CSV
@@ -48,64 +48,33 @@ def init_from_csv(csv_path: str):
     print(f"   End:   {end_dt}")
     print(f"   Total: {total_hours:,} hours ({total_hours/24:.1f} days)")
     
-    # Prepare data for insertion with robust validation
+    # Prepare data for insertion with robust validation (vectorized)
     print(f"\n⚙️  Processing data...")
-    data_to_insert = []
-    skipped = 0
-    
-    for _, row in df.iterrows():
-        pm25_val = row['pm25']
-        
-        # Robust validation: try converting to float
-        try:
-            pm25_clean = float(pm25_val)
-            if pd.isna(pm25_clean):  # Catches NaN after conversion
-                pm25_clean = None
-                skipped += 1
-        except (ValueError, TypeError):
-            pm25_clean = None  # Invalid (will be forward-filled)
-            skipped += 1
-        
-        # Keep ALL rows (don't skip) to maintain continuous time series
-        data_to_insert.append({
-            'datetime': row['datetime'].strftime('%Y-%m-%d %H:%M'),
-            'pm25': pm25_clean,
-            'sitename': Config.SITE_NAME,
-            'source': 'history'
-        })
-    
-    print(f"   Valid records: {len(data_to_insert):,}")
+    # Invalid strings become NaN and are forward-filled below
+    df['pm25'] = pd.to_numeric(df['pm25'], errors='coerce')
+    skipped = int(df['pm25'].isna().sum())
+    
+    print(f"   Valid records: {len(df):,}")
     print(f"   Skipped (NaN): {skipped}")
     
-    # Apply forward-fill for any gaps
+    # Apply forward-fill for any gaps; leading NaNs have nothing to fill from
     print(f"\n🔧 Applying forward-fill...")
-    data_to_insert.sort(key=lambda x: x['datetime'])
-    last_valid = None
-    filled_data = []
-    filled_count = 0
-    
-    for record in data_to_insert:
-        if record['pm25'] is not None:
-            last_valid = record['pm25']
-            filled_data.append(record)
-        elif last_valid is not None:
-            record['pm25'] = last_valid
-            filled_data.append(record)
-            filled_count += 1
+    df['pm25'] = df['pm25'].ffill()
+    df = df.dropna(subset=['pm25'])
+    filled_count = skipped - (total_hours - len(df))
     
     if filled_count > 0:
         print(f"   Forward-filled: {filled_count} records")
     
-    # Insert into database in batches
-    print(f"\n💾 Inserting into database...")
-    batch_size = 1000
-    total = len(filled_data)
+    df['datetime_str'] = df['datetime'].dt.strftime('%Y-%m-%d %H:%M')
+    filled_data = [
+        {'datetime': d, 'pm25': p, 'sitename': Config.SITE_NAME, 'source': 'history'}
+        for d, p in zip(df['datetime_str'].tolist(), df['pm25'].tolist())
+    ]
     
-    for i in range(0, total, batch_size):
-        batch = filled_data[i:i+batch_size]
-        db.insert_measurements_bulk(batch)
-        progress = min(i+batch_size, total)
-        print(f"   Progress: {progress:,}/{total:,} ({progress/total*100:.1f}%)")
+    # Insert into database in a single transaction
+    print(f"\n💾 Inserting {len(filled_data):,} records into database...")
+    db.insert_measurements_bulk_fast(filled_data)
     
     # Verify
     count = db.get_measurement_count()
@@ -1,22 +1,50 @@
+import os
+import json
 import numpy as np
 import tensorflow as tf
 from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
 from typing import List, Dict
 from backend.config import Config
-from backend.database import Database
+from backend.database import Database, get_db
 
 class PredictionService:
     def __init__(self, db: Database = None):
         self.model_path = Config.MODEL_PATH
+        self.tflite_model_path = Config.TFLITE_MODEL_PATH
         self.sequence_length = Config.SEQUENCE_LENGTH
         self.prediction_hours = Config.PREDICTION_HOURS
-        self.db = db or Database()
+        self.db = db or get_db()
+        self.timezone = ZoneInfo(Config.TIMEZONE)
         self.model = None
+        self.interpreter = None
         self.scaler_params = None
+        self.fixed_scaler = False
         self._load_model()
+        self._load_scaler()
+        
+        # Sliding input window reused across hourly predictions
+        self._window = np.zeros(self.sequence_length, dtype=np.float32)
+        self._input_buf = np.zeros((1, self.sequence_length, 1), dtype=np.float32)
+        self._last_insert_dt = None
     
     def _load_model(self):
-        """Load trained Transformer model"""
+        """Load TFLite model if converted, otherwise fall back to the Keras model"""
+        if os.path.exists(self.tflite_model_path):
+            try:
+                print(f"📦 Loading TFLite model from {self.tflite_model_path}...")
+                self.interpreter = tf.lite.Interpreter(model_path=self.tflite_model_path)
+                self.interpreter.allocate_tensors()
+                self._input_index = self.interpreter.get_input_details()[0]['index']
+                self._output_index = self.interpreter.get_output_details()[0]['index']
+                print("✅ TFLite model loaded successfully")
+                print(f"   Input shape: {self.interpreter.get_input_details()[0]['shape']}")
+                print(f"   Output shape: {self.interpreter.get_output_details()[0]['shape']}")
+                return
+            except Exception as e:
+                print(f"[WARN] Failed to load TFLite model, falling back to Keras: {e}")
+                self.interpreter = None
+        
         try:
             print(f"📦 Loading model from {self.model_path}...")
             self.model = tf.keras.models.load_model(self.model_path)
@@ -27,11 +55,37 @@ class PredictionService:
             print(f"[ERROR] Failed to load model: {e}")
             self.model = None
     
+    def _load_scaler(self):
+        """Load fixed training-set min/max from scaler.json next to the model"""
+        scaler_path = os.path.join(os.path.dirname(self.model_path), 'scaler.json')
+        try:
+            with open(scaler_path) as f:
+                params = json.load(f)
+            self.scaler_params = {'min': float(params['min']), 'max': float(params['max'])}
+            self.fixed_scaler = True
+            print(f"✅ Scaler loaded: min={self.scaler_params['min']}, max={self.scaler_params['max']}")
+        except FileNotFoundError:
+            print(f"[WARN] {scaler_path} not found, fitting scaler per prediction window")
+        except Exception as e:
+            print(f"[WARN] Failed to load scaler params, fitting per prediction window: {e}")
+    
+    def _run_model(self, X: np.ndarray) -> np.ndarray:
+        """Run a single forward pass, returns shape (1, 24)"""
+        if self.interpreter is not None:
+            # No-op when X is already the float32 _input_buf
+            self.interpreter.set_tensor(self._input_index, X.astype(np.float32, copy=False))
+            self.interpreter.invoke()
+            return self.interpreter.get_tensor(self._output_index)
+        return self.model.predict(X, verbose=0)
+    
     def _normalize_data(self, data: np.ndarray) -> np.ndarray:
         """
         Normalize data using min-max scaling [0, 1].
-        Same method as training.
+        Uses the fixed training-set params when scaler.json is available.
         """
+        if self.fixed_scaler:
+            return (data - self.scaler_params['min']) / (self.scaler_params['max'] - self.scaler_params['min'])
+        
         min_val = np.min(data)
         max_val = np.max(data)
         
@@ -56,12 +110,40 @@ class PredictionService:
         
         return data * (max_val - min_val) + min_val
     
+    def _refresh_window(self) -> bool:
+        """
+        Slide hours stored since the last call into the raw input window.
+        Falls back to a full fetch on cold start or when the gap covers the whole window.
+        Returns False if there is not enough data.
+        """
+        if self._last_insert_dt is not None:
+            new_rows = self.db.get_pm25_after(self._last_insert_dt, self.sequence_length)
+            k = len(new_rows)
+            if k < self.sequence_length:
+                if k:
+                    # Overlapping in-place shift, then write the new hours at the end
+                    self._window[:-k] = self._window[k:]
+                    self._window[-k:] = [r[1] for r in new_rows]
+                    self._last_insert_dt = new_rows[-1][0]
+                    print(f"[INFO] Appended {k} new hour(s) to input window")
+                return True
+        
+        # Cold start or large gap: load the full window
+        pm25_values = self.db.get_last_n_hours_pm25(self.sequence_length)
+        if len(pm25_values) < self.sequence_length:
+            print(f"[ERROR] Not enough data: {len(pm25_values)}/{self.sequence_length} hours")
+            return False
+        
+        self._window[:] = pm25_values
+        self._last_insert_dt = self.db.get_latest_datetime()
+        return True
+    
     def predict_24h(self) -> List[Dict]:
         """
         Generate 24-hour predictions based on last 720 hours of data.
         Returns list of {target_datetime, predicted_pm25} dicts.
         """
-        if self.model is None:
+        if self.model is None and self.interpreter is None:
             print("[ERROR] Model not loaded, cannot make predictions")
             return []
         
@@ -69,31 +151,23 @@ class PredictionService:
         print(f"🔮 PREDICTION START: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
         print("="*60)
         
-        # Get last 720 hours from database
-        data = self.db.get_last_n_hours(self.sequence_length)
-        
-        if len(data) < self.sequence_length:
-            print(f"[ERROR] Not enough data: {len(data)}/{self.sequence_length} hours")
+        # Update the last 720 PM2.5 values, fetching only hours added since the last run
+        if not self._refresh_window():
             return []
         
-        # Extract PM2.5 values
-        pm25_values = np.array([record['pm25'] for record in data])
-        
-        # Normalize
-        pm25_normalized = self._normalize_data(pm25_values)
-        
-        # Reshape for model input: (1, 720, 1)
-        X = pm25_normalized.reshape(1, self.sequence_length, 1)
+        # Normalize into the preallocated model input: (1, 720, 1)
+        self._input_buf[0, :, 0] = self._normalize_data(self._window)
+        X = self._input_buf
         
         # Predict
         print(f"🧠 Running model inference...")
-        predictions_normalized = self.model.predict(X, verbose=0)  # Shape: (1, 24)
+        predictions_normalized = self._run_model(X)  # Shape: (1, 24)
         
         # Denormalize
         predictions = self._denormalize_data(predictions_normalized[0])
         
         # Generate target datetimes (next 24 hours)
-        last_datetime_str = data[-1]['datetime']
+        last_datetime_str = self._last_insert_dt
         last_datetime = datetime.strptime(last_datetime_str, '%Y-%m-%d %H:%M')
         
         results = []
@@ -108,8 +182,9 @@ class PredictionService:
         print(f"   Next hour: {results[0]['target_datetime']} : {results[0]['predicted_pm25']} μg/m³")
         print(f"   Hour +24:  {results[-1]['target_datetime']} : {results[-1]['predicted_pm25']} μg/m³")
         
-        # Store predictions in database
-        prediction_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        # Store predictions in database (station-local time, same clock as the
+        # scheduler's predictions_exist_for startup check)
+        prediction_time = datetime.now(self.timezone).strftime('%Y-%m-%d %H:%M:%S')
         self.db.insert_predictions(prediction_time, results)
         
         print("="*60)
@@ -1,141 +1,393 @@
 import google.generativeai as genai
+import bisect
+import functools
+import logging
+import re
+import numpy as np
+import threading
+import time
 from datetime import datetime
-from typing import Dict, Any
+from zoneinfo import ZoneInfo
+from typing import Dict, Any, Iterator, Optional
+from backend.blocking import native_executor
 from backend.config import Config
-from backend.database import Database
+from backend.database import Database, get_db
 
-class RAGChatbot:
-    def __init__(self, db: Database = None):
-        self.db = db or Database()
-        genai.configure(api_key=Config.GEMINI_API_KEY)
-        
-        # Get database date range for constraints
-        data_range = self.db.get_data_range()
-        self.earliest_date = data_range['earliest'] if data_range else '2018-01-01 00:00'
-        self.latest_date = data_range['latest'] if data_range else datetime.now().strftime('%Y-%m-%d %H:%M')
-        
-        # Define function declarations as dictionaries (new API format)
-        self.tools = [
+logger = logging.getLogger(__name__)
+
+# SDK credentials are process-global; set them once at import
+genai.configure(api_key=Config.GEMINI_API_KEY)
+
+# Canned replies returned when Gemini fails; callers should not cache these
+NO_RESPONSE = "I couldn't generate a response. Please try rephrasing your question."
+ERROR_RESPONSE = "Sorry, I encountered an error processing your query. Please try again."
+
+def is_cacheable(answer: str) -> bool:
+    """False for canned failure replies (a streamed answer may end in ERROR_RESPONSE)"""
+    return not answer.endswith((NO_RESPONSE, ERROR_RESPONSE))
+
+# Health bands used for canned fast-route answers (same table as the system prompt)
+_BAND_THRESHOLDS = (12, 35, 55, 150, 250)
+_BAND_LABELS = (
+    ("Good", "air quality is satisfactory"),
+    ("Moderate", "acceptable for most people"),
+    ("Unhealthy for Sensitive Groups", "sensitive groups may be affected"),
+    ("Unhealthy", "everyone may experience health effects"),
+    ("Very Unhealthy", "this is a health alert"),
+    ("Hazardous", "emergency conditions")
+)
+
+# Queries mentioning explicit dates or other periods always go to Gemini uncached
+_PM25_TOKEN = re.compile(r'pm\s*2\.?5', re.I)
+_EXPLICIT_PERIOD = re.compile(r'\d|yesterday|tomorrow|\blast\b|\bago\b|\bweek|\byear|predict|forecast', re.I)
+# Questions whose answer depends on which period or extreme they name; near-identical
+# embeddings ("worst day in March" vs "in April", "highest" vs "lowest") must not share
+# a semantic-cache entry. Broader than _EXPLICIT_PERIOD, which gates the fast routes.
+_PERIOD_OR_EXTREME = re.compile(
+    r"\d"
+    r"|\b(?:jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?"
+    r"|sep(?:t(?:ember)?)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?)\b"
+    r"|\b(?:mon|tues|wednes|thurs|fri|satur|sun)day\b|\bweekends?\b"
+    r"|\b(?:today|tonight|yesterday|tomorrow|ago|morning|afternoon|evening|night|overnight)\b"
+    r"|\b(?:this|last|next|past|previous)\s+(?:hour|day|week|month|year|season)s?\b"
+    r"|\b(?:hourly|daily|weekly|monthly|yearly|annual)\b"
+    r"|\b(?:highest|lowest|max(?:imum)?|min(?:imum)?|worst|best|most|least|peak|cleanest|dirtiest)\b"
+    r"|predict|forecast",
+    re.I
+)
+# Questions asking for judgement or advice need Gemini even if they mention a reading
+_NEEDS_REASONING = re.compile(r'\b(why|should|safe|advice|advise|recommend|healthy|good time)\b', re.I)
+# Fast routes must match the whole query: an optional lookup phrase, the lookup itself, punctuation
+_ASK = r"^\s*(?:(?:what(?:'s|\s+is|\s+was)|show(?:\s+me)?|tell\s+me|give\s+me)\s+)?(?:the\s+)?"
+_END = r"\s*[?.!]*\s*$"
+_PM25_OR_AQI = r"(?:pm\s*2\.?5|air quality)"
+
+def _health_band(pm25: float) -> str:
+    """Format the health band sentence fragment for a PM2.5 value"""
+    label, advice = _BAND_LABELS[bisect.bisect_left(_BAND_THRESHOLDS, pm25)]
+    return f"{label} ({advice})"
+
+# Static tail of the chatbot system instruction, allocated once at import
+_SYSTEM_BODY = """When users ask about air quality:
+1. Use the appropriate function to query the database
+2. Interpret results with health context:
+   - Good (0-12 μg/m³): Air quality is satisfactory
+   - Moderate (13-35 μg/m³): Acceptable for most people
+   - Unhealthy for Sensitive (36-55 μg/m³): May affect sensitive groups
+   - Unhealthy (56-150 μg/m³): Everyone may experience health effects
+   - Very Unhealthy (151-250 μg/m³): Health alert
+   - Hazardous (250+ μg/m³): Emergency conditions
+
+3. Provide concise, helpful responses (2-3 sentences)
+4. If asked about dates outside available range, inform user politely"""
+
+# Function declarations as dictionaries (new API format); {data_range} in the
+# query_date_range description is filled in per data-range update
+_TOOL_SCHEMA = [
+    {
+        "function_declarations": [
             {
-                "function_declarations": [
-                    {
-                        "name": "query_date_range",
-                        "description": f"Query PM2.5 statistics (average, min, max, count) for a specific date range. Available data: {self.earliest_date} to {self.latest_date}",
-                        "parameters": {
-                            "type": "object",
-                            "properties": {
-                                "start_date": {
-                                    "type": "string",
-                                    "description": "Start datetime in format 'YYYY-MM-DD HH:MM'"
-                                },
-                                "end_date": {
-                                    "type": "string",
-                                    "description": "End datetime in format 'YYYY-MM-DD HH:MM'"
-                                }
-                            },
-                            "required": ["start_date", "end_date"]
+                "name": "query_date_range",
+                "description": "Query PM2.5 statistics (average, min, max, count) for a specific date range. Available data: {data_range}",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "start_date": {
+                            "type": "string",
+                            "description": "Start datetime in format 'YYYY-MM-DD HH:MM'"
+                        },
+                        "end_date": {
+                            "type": "string",
+                            "description": "End datetime in format 'YYYY-MM-DD HH:MM'"
                         }
                     },
-                    {
-                        "name": "query_exact_datetime",
-                        "description": "Get exact PM2.5 value at a specific datetime",
-                        "parameters": {
-                            "type": "object",
-                            "properties": {
-                                "datetime_str": {
-                                    "type": "string",
-                                    "description": "Datetime in format 'YYYY-MM-DD HH:MM'"
-                                }
-                            },
-                            "required": ["datetime_str"]
+                    "required": ["start_date", "end_date"]
+                }
+            },
+            {
+                "name": "query_exact_datetime",
+                "description": "Get exact PM2.5 value at a specific datetime",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "datetime_str": {
+                            "type": "string",
+                            "description": "Datetime in format 'YYYY-MM-DD HH:MM'"
                         }
                     },
-                    {
-                        "name": "query_worst_day",
-                        "description": "Find the day with highest average PM2.5 in a date range",
-                        "parameters": {
-                            "type": "object",
-                            "properties": {
-                                "start_date": {
-                                    "type": "string",
-                                    "description": "Start date in format 'YYYY-MM-DD HH:MM'"
-                                },
-                                "end_date": {
-                                    "type": "string",
-                                    "description": "End date in format 'YYYY-MM-DD HH:MM'"
-                                }
-                            },
-                            "required": ["start_date", "end_date"]
+                    "required": ["datetime_str"]
+                }
+            },
+            {
+                "name": "query_worst_day",
+                "description": "Find the day with highest average PM2.5 in a date range",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "start_date": {
+                            "type": "string",
+                            "description": "Start date in format 'YYYY-MM-DD HH:MM'"
+                        },
+                        "end_date": {
+                            "type": "string",
+                            "description": "End date in format 'YYYY-MM-DD HH:MM'"
                         }
                     },
-                    {
-                        "name": "query_monthly_average",
-                        "description": "Get average PM2.5 for a specific month",
-                        "parameters": {
-                            "type": "object",
-                            "properties": {
-                                "year": {
-                                    "type": "integer",
-                                    "description": "Year (e.g., 2023)"
-                                },
-                                "month": {
-                                    "type": "integer",
-                                    "description": "Month (1-12)"
-                                }
-                            },
-                            "required": ["year", "month"]
+                    "required": ["start_date", "end_date"]
+                }
+            },
+            {
+                "name": "query_monthly_average",
+                "description": "Get average PM2.5 for a specific month",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "year": {
+                            "type": "integer",
+                            "description": "Year (e.g., 2023)"
+                        },
+                        "month": {
+                            "type": "integer",
+                            "description": "Month (1-12)"
                         }
-                    }
-                ]
+                    },
+                    "required": ["year", "month"]
+                }
             }
         ]
+    }
+]
+
+@functools.lru_cache(maxsize=1)
+def _data_range_cached(db: Database, epoch_hour: int) -> Optional[Dict]:
+    """Database data range, recomputed at most once per hour (epoch_hour changes hourly)"""
+    return db.get_data_range()
+
+@functools.lru_cache(maxsize=1)
+def _build_tools(earliest_date: str, latest_date: str) -> genai.types.FunctionLibrary:
+    """
+    Compile the tool schema (data range filled in) into a FunctionLibrary once per range.
+    GenerativeModel uses a FunctionLibrary as-is instead of re-parsing the dict tree.
+    """
+    declarations = list(_TOOL_SCHEMA[0]["function_declarations"])
+    first = dict(declarations[0])
+    first["description"] = first["description"].format(data_range=f"{earliest_date} to {latest_date}")
+    declarations[0] = first
+    return genai.types.FunctionLibrary(tools=[{"function_declarations": declarations}])
+
+class SemanticCache:
+    """
+    In-memory cache of chatbot answers keyed by query embedding + hour bucket.
+    Embeddings are stored as unit rows of a preallocated matrix, so a lookup is
+    a single matrix-vector product. Least recently used entries are evicted first.
+    """
+    def __init__(self, threshold: float = 0.85, max_entries: int = 512):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._matrix = None  # (max_entries, dim), allocated on first put
+        self._buckets = np.empty(max_entries, dtype='U13')
+        self._last_used = np.zeros(max_entries, dtype=np.float64)
+        self._responses = [None] * max_entries
+        self._size = 0
+        self._lock = threading.Lock()
+    
+    def get(self, embedding: np.ndarray, bucket: str) -> Optional[str]:
+        """Return the cached answer for the most similar query in the same bucket"""
+        with self._lock:
+            if self._size == 0:
+                return None
+            sims = self._matrix[:self._size] @ embedding
+            sims[self._buckets[:self._size] != bucket] = -1.0
+            best = int(np.argmax(sims))
+            if sims[best] <= self.threshold:
+                return None
+            self._last_used[best] = time.time()
+            return self._responses[best]
+    
+    def put(self, embedding: np.ndarray, bucket: str, response: str):
+        """Store an answer, evicting the least recently used entry when full"""
+        with self._lock:
+            if self._matrix is None:
+                self._matrix = np.zeros((self.max_entries, embedding.shape[0]), dtype=np.float32)
+            if self._size < self.max_entries:
+                row = self._size
+                self._size += 1
+            else:
+                row = int(np.argmin(self._last_used))
+            self._matrix[row] = embedding
+            self._buckets[row] = bucket
+            self._last_used[row] = time.time()
+            self._responses[row] = response
+    
+    def clear(self):
+        """Drop all cached answers"""
+        with self._lock:
+            self._size = 0
+            self._responses = [None] * self.max_entries
+
+class RAGChatbot:
+    def __init__(self, db: Database = None):
+        self.db = db or get_db()
+        self.timezone = ZoneInfo(Config.TIMEZONE)
+        self.semantic_cache = SemanticCache()
+        # Advice only changes when new hourly data arrives, so memoize per input triple
+        self._advice_for = functools.lru_cache(maxsize=128)(self._generate_advice)
+        
+        # Database date range for constraints; refreshed hourly by _refresh_data_range
+        self.earliest_date = None
+        self.latest_date = None
+        
+        # Worker pool for running several tool calls from one Gemini turn in parallel
+        # (native threads: SQLite calls never yield to the gevent hub)
+        self._io_pool = native_executor(max_workers=4)
+        
+        # Tool name -> database call, one entry per declaration in _TOOL_SCHEMA
+        self._dispatch = {
+            "query_date_range": lambda a: self.db.query_date_range(a['start_date'], a['end_date']),
+            "query_exact_datetime": lambda a: self.db.query_exact_datetime(a['datetime_str']),
+            "query_worst_day": lambda a: self.db.query_worst_day(a['start_date'], a['end_date']),
+            "query_monthly_average": lambda a: self.db.query_monthly_average(a['year'], a['month'])
+        }
+        
+        # Common questions answered straight from the database, skipping the LLM
+        self._fast_routes = [
+            (re.compile(_ASK + r"(?:(?:current|latest)\s+" + _PM25_OR_AQI + r"(?:\s+(?:level|reading|value))?(?:\s+(?:now|right now))?"
+                        r"|" + _PM25_OR_AQI + r"(?:\s+(?:level|reading|value))?\s+(?:now|right now|currently))" + _END, re.I),
+             self._route_current),
+            (re.compile(_ASK + r"(?:today'?s\s+(?:average|avg|mean)(?:\s+pm\s*2\.?5)?"
+                        r"|(?:average|avg|mean)(?:\s+pm\s*2\.?5)?(?:\s+(?:for|of))?\s+today)" + _END, re.I),
+             self._route_today_average),
+            (re.compile(_ASK + r"(?:worst|highest|most polluted)\s+(?:pm\s*2\.?5\s+)?(?:day|date)\s+(?:of\s+|in\s+)?this\s+month" + _END, re.I),
+             self._route_worst_day_this_month),
+        ]
+        
+        # Initialize model with tools and the system prompt header for the current data range
+        self._refresh_data_range()
+        
+        # Plain model (no tools) for short advice, built once and reused
+        self.model_simple = genai.GenerativeModel('gemini-2.5-flash')
+    
+    def _refresh_data_range(self):
+        """Pick up the hourly data range; tools, model and prompt header are rebuilt only when it moved"""
+        data_range = _data_range_cached(self.db, int(time.time() // 3600))
+        earliest = data_range['earliest'] if data_range else '2018-01-01 00:00'
+        latest = data_range['latest'] if data_range else datetime.now().strftime('%Y-%m-%d %H:00')
+        if (earliest, latest) == (self.earliest_date, self.latest_date):
+            return
         
-        # Initialize model with tools
+        self.earliest_date, self.latest_date = earliest, latest
+        self.tools = _build_tools(earliest, latest)
         self.model = genai.GenerativeModel(
             model_name='gemini-2.5-flash',
             tools=self.tools
         )
+        
+        # System prompt header with the data range baked in; only {now} is filled per query
+        self._system_header_template = (
+            "You are an air quality assistant analyzing PM2.5 data from Taiwan (土城 monitoring station).\n\n"
+            f"Available data range: {earliest} to {latest}\n"
+            "Current datetime: {now}\n\n"
+        )
     
     def execute_function(self, function_name: str, args: Dict[str, Any]) -> Any:
         """Execute the database query function"""
+        fn = self._dispatch.get(function_name)
+        if fn is None:
+            return {"error": f"Unknown function: {function_name}"}
         try:
-            if function_name == "query_date_range":
-                return self.db.query_date_range(args['start_date'], args['end_date'])
-            elif function_name == "query_exact_datetime":
-                return self.db.query_exact_datetime(args['datetime_str'])
-            elif function_name == "query_worst_day":
-                return self.db.query_worst_day(args['start_date'], args['end_date'])
-            elif function_name == "query_monthly_average":
-                return self.db.query_monthly_average(args['year'], args['month'])
-            else:
-                return {"error": f"Unknown function: {function_name}"}
+            return fn(args)
         except Exception as e:
             return {"error": str(e)}
     
+    def _route_fast(self, user_query: str) -> Optional[str]:
+        """Answer template-like queries from the database; None means ask Gemini"""
+        if _EXPLICIT_PERIOD.search(_PM25_TOKEN.sub('', user_query)) or _NEEDS_REASONING.search(user_query):
+            return None
+        for rx, handler in self._fast_routes:
+            if rx.match(user_query):
+                return handler()
+        return None
+    
+    def _route_current(self) -> Optional[str]:
+        """Latest measurement plus next-hour prediction"""
+        snapshot = self.db.get_current_snapshot()
+        if not snapshot:
+            return None
+        answer = (f"The latest PM2.5 reading at {Config.SITE_NAME} is {snapshot['pm25']} μg/m³ "
+                  f"({snapshot['datetime']}), which is {_health_band(snapshot['pm25'])}.")
+        if snapshot['next_pred'] is not None:
+            answer += f" The model predicts {snapshot['next_pred']} μg/m³ for the next hour."
+        return answer
+    
+    def _route_today_average(self) -> Optional[str]:
+        """Average PM2.5 for today so far"""
+        today = datetime.now(self.timezone).strftime('%Y-%m-%d')
+        stats = self.db.query_date_range(f"{today} 00:00", f"{today} 23:59")
+        if not stats:
+            return None
+        return (f"Today's average PM2.5 so far is {stats['avg_pm25']} μg/m³ "
+                f"(min {stats['min_pm25']}, max {stats['max_pm25']} over {stats['count']} hours), "
+                f"which is {_health_band(stats['avg_pm25'])}.")
+    
+    def _route_worst_day_this_month(self) -> Optional[str]:
+        """Day with the highest average PM2.5 in the current month"""
+        now = datetime.now(self.timezone)
+        worst = self.db.query_worst_day(now.strftime('%Y-%m-01 00:00'), now.strftime('%Y-%m-%d %H:%M'))
+        if not worst:
+            return None
+        return (f"The worst day so far this month was {worst['date']}, with an average PM2.5 of "
+                f"{worst['avg_pm25']} μg/m³ (peak {worst['max_pm25']} μg/m³), which is "
+                f"{_health_band(worst['avg_pm25'])}.")
+    
     def query_data(self, user_query: str) -> str:
-        """Process user query using Gemini function calling"""
+        """Answer user query, reusing the answer to a similar question from the same hour"""
+        return ''.join(self.query_data_stream(user_query))
+    
+    def query_data_stream(self, user_query: str) -> Iterator[str]:
+        """Answer user query, yielding text chunks as Gemini produces them"""
+        # Template-like questions are answered directly from the database
+        fast = self._route_fast(user_query)
+        if fast is not None:
+            print("[DEBUG] Fast route hit")
+            yield fast
+            return
+        
+        # Hour bucket keeps cached answers in step with the hourly data updates
+        bucket = datetime.now(self.timezone).strftime('%Y-%m-%d %H')
+        # Questions naming a date, period or extreme embed almost identically to ones
+        # naming a different one, so they skip the semantic tier
+        embedding = None
+        if not _PERIOD_OR_EXTREME.search(_PM25_TOKEN.sub('', user_query)):
+            embedding = self.embed_query(user_query)
+        if embedding is not None:
+            cached = self.semantic_cache.get(embedding, bucket)
+            if cached is not None:
+                print("[DEBUG] Semantic cache hit")
+                yield cached
+                return
+        
+        chunks = []
+        for chunk in self._query_gemini_stream(user_query):
+            chunks.append(chunk)
+            yield chunk
+        
+        answer = ''.join(chunks)
+        if embedding is not None and is_cacheable(answer):
+            self.semantic_cache.put(embedding, bucket, answer)
+    
+    def _query_gemini_stream(self, user_query: str) -> Iterator[str]:
+        """Process user query using Gemini function calling, streaming the text reply"""
+        produced = False
         try:
-            system_instruction = f"""You are an air quality assistant analyzing PM2.5 data from Taiwan (土城 monitoring station).
-
-Available data range: {self.earliest_date} to {self.latest_date}
-Current datetime: {datetime.now().strftime('%Y-%m-%d %H:%M')}
-
-When users ask about air quality:
-1. Use the appropriate function to query the database
-2. Interpret results with health context:
-   - Good (0-12 μg/m³): Air quality is satisfactory
-   - Moderate (13-35 μg/m³): Acceptable for most people
-   - Unhealthy for Sensitive (36-55 μg/m³): May affect sensitive groups
-   - Unhealthy (56-150 μg/m³): Everyone may experience health effects
-   - Very Unhealthy (151-250 μg/m³): Health alert
-   - Hazardous (250+ μg/m³): Emergency conditions
-
-3. Provide concise, helpful responses (2-3 sentences)
-4. If asked about dates outside available range, inform user politely"""
+            self._refresh_data_range()
+            model, header_template = self.model, self._system_header_template
+            system_instruction = header_template.format(
+                now=datetime.now(self.timezone).strftime('%Y-%m-%d %H:%M')
+            ) + _SYSTEM_BODY
             
-            chat = self.model.start_chat(history=[])
+            chat = model.start_chat(history=[])
             full_prompt = f"{system_instruction}\n\nUser question: {user_query}"
-            response = chat.send_message(full_prompt)
+            response = chat.send_message(full_prompt, stream=True)
             
             # Handle function calls
             max_iterations = 5
@@ -144,34 +396,30 @@ When users ask about air quality:
             while iteration < max_iterations:
                 iteration += 1
                 
-                if not response.candidates:
-                    break
+                # Pass text through as it arrives; function calls are gathered from the
+                # chunks and executed once the stream for this turn is complete
+                function_calls = []
+                for chunk in response:
+                    if not chunk.candidates:
+                        continue
                     
-                parts = response.candidates[0].content.parts
-                if not parts:
-                    break
-                
-                # Check for function calls
-                function_calls = [part for part in parts if hasattr(part, 'function_call') and part.function_call]
+                    # Parts are protos: both fields always exist
+                    for part in chunk.candidates[0].content.parts:
+                        if part.function_call and part.function_call.name:
+                            function_calls.append(part)
+                        elif part.text:
+                            produced = True
+                            yield part.text
                 
                 if not function_calls:
-                    # No function calls, check for text response
-                    text_parts = [part.text for part in parts if hasattr(part, 'text')]
-                    if text_parts:
-                        return ''.join(text_parts)
                     break
                 
-                # Process ALL function calls before sending back
-                function_responses = []
+                # Collect ALL function calls before executing
+                calls = []
                 for part in function_calls:
                     function_call = part.function_call
                     function_name = function_call.name
                     
-                    # Skip if function name is empty
-                    if not function_name:
-                        print(f"[WARN] Skipping function call with empty name")
-                        continue
-                    
                     # Check if args exists
                     if function_call.args is not None:
                         function_args = dict(function_call.args)
@@ -179,34 +427,57 @@ When users ask about air quality:
                         function_args = {}
                     
                     print(f"[DEBUG] Gemini called: {function_name}({function_args})")
-                    
-                    # Execute function
-                    result = self.execute_function(function_name, function_args)
+                    calls.append((function_name, function_args))
+                
+                # Execute independent calls concurrently; results keep call order
+                if len(calls) > 1:
+                    futures = [self._io_pool.submit(self.execute_function, name, args) for name, args in calls]
+                    results = [f.result() for f in futures]
+                else:
+                    results = [self.execute_function(name, args) for name, args in calls]
+                
+                function_responses = []
+                for (function_name, _), result in zip(calls, results):
                     print(f"[DEBUG] Function result: {result}")
                     
-                    # Collect function response
-                    function_responses.append({
-                        "function_response": {
-                            "name": function_name,
-                            "response": {"result": result}
-                        }
-                    })
-                
-                # If no valid function calls were processed, break
-                if not function_responses:
-                    print("[WARN] No valid function calls to process")
-                    break
+                    # Collect function response as a proto Part (skips dict->proto conversion in the SDK)
+                    function_responses.append(genai.protos.Part(
+                        function_response=genai.protos.FunctionResponse(
+                            name=function_name,
+                            response={"result": result}
+                        )
+                    ))
                 
                 # Send ALL function responses back at once
-                response = chat.send_message({"parts": function_responses})
+                response = chat.send_message(function_responses, stream=True)
 
-            return "I couldn't generate a response. Please try rephrasing your question."
+            if not produced:
+                yield NO_RESPONSE
         
+        except Exception:
+            logger.exception("RAG query failed")
+            # Text already streamed to the caller can't be taken back, so append
+            yield ("\n\n" if produced else "") + ERROR_RESPONSE
+    
+    def embed_query(self, text: str) -> Optional[np.ndarray]:
+        """Embed text as a unit-length float32 vector (None if the API call fails)"""
+        try:
+            result = genai.embed_content(model='models/text-embedding-004', content=text)
+            vec = np.asarray(result['embedding'], dtype=np.float32)
+            return vec / np.linalg.norm(vec)
         except Exception as e:
-            print(f"[ERROR] RAG query failed: {e}")
-            import traceback
-            traceback.print_exc()
-            return "Sorry, I encountered an error processing your query. Please try again."
+            print(f"[WARN] Embedding failed: {e}")
+            return None
+    
+    def _generate_advice(self, pm25: float, dt: str, next_hour: Optional[float]) -> str:
+        """Ask Gemini for brief health advice (memoized as self._advice_for)"""
+        query = f"The current PM2.5 level is {pm25} μg/m³ at {dt}."
+        if next_hour:
+            query += f" The predicted PM2.5 for the next hour is {next_hour} μg/m³."
+        query += " Provide brief health advice (2 sentences max)."
+        
+        response = self.model_simple.generate_content(query)
+        return response.text
     
     def get_current_status(self) -> str:
         """Get current PM2.5 status with AI-generated advice"""
@@ -221,15 +492,8 @@ When users ask about air quality:
             predictions = self.db.get_latest_predictions()
             next_hour = predictions[0]['predicted_pm25'] if predictions else None
             
-            query = f"The current PM2.5 level is {current_pm25} μg/m³ at {current_datetime}."
-            if next_hour:
-                query += f" The predicted PM2.5 for the next hour is {next_hour} μg/m³."
-            query += " Provide brief health advice (2 sentences max)."
-            
-            model_simple = genai.GenerativeModel('gemini-2.5-flash')
-            response = model_simple.generate_content(query)
-            return response.text
+            return self._advice_for(current_pm25, current_datetime, next_hour)
         
-        except Exception as e:
-            print(f"[ERROR] Status query failed: {e}")
+        except Exception:
+            logger.exception("Status query failed")
             return "Unable to retrieve current status."
\ No newline at end of file
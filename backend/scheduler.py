@@ -1,19 +1,42 @@
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
 from datetime import datetime
-import pytz
+import logging
+import threading
+from zoneinfo import ZoneInfo
+from typing import Callable, Optional
+from backend.blocking import gevent_patched, run_blocking
 from backend.config import Config
-from backend.database import Database
+from backend.database import Database, get_db
 from backend.crawler import EPACrawler
 from backend.prediction_service import PredictionService
 
+logger = logging.getLogger(__name__)
+
+def _make_scheduler(timezone):
+    """
+    Run jobs on the gevent hub when the web server has monkey-patched the process
+    (shares its event loop, no extra OS thread); otherwise use a background thread.
+    Jobs hand their blocking steps to native threads via run_blocking.
+    """
+    if gevent_patched():
+        from apscheduler.schedulers.gevent import GeventScheduler
+        return GeventScheduler(timezone=timezone)
+    return BackgroundScheduler(timezone=timezone)
+
 class HourlyScheduler:
-    def __init__(self):
-        self.scheduler = BackgroundScheduler()
-        self.timezone = pytz.timezone(Config.TIMEZONE)
-        self.db = Database()
+    def __init__(self, db: Database = None, on_update: Optional[Callable[[], None]] = None):
+        self.timezone = ZoneInfo(Config.TIMEZONE)
+        self.scheduler = _make_scheduler(self.timezone)
+        self.db = db or get_db()
         self.crawler = EPACrawler(self.db)
         self.predictor = PredictionService(self.db)
+        # Invoked after every hourly cycle so callers can drop stale cached data
+        self.on_update = on_update
+        # The startup run and the cron run are separate jobs that may overlap; the
+        # predictor's sliding window and TFLite interpreter must not be shared by two
+        # cycles (under gevent this is a greenlet-aware lock)
+        self._task_lock = threading.Lock()
     
     def hourly_task(self):
         """
@@ -21,27 +44,35 @@ class HourlyScheduler:
         1. Crawl new data from EPA API
         2. Run model inference
         3. Store predictions
+        4. Notify on_update listener
         """
+        with self._task_lock:
+            self._run_cycle()
+    
+    def _run_cycle(self):
+        """One crawl + predict + notify cycle; callers hold _task_lock"""
         print("\n" + "🔄"*30)
         print(f"⏰ HOURLY TASK TRIGGERED: {datetime.now(self.timezone).strftime('%Y-%m-%d %H:%M:%S %Z')}")
         print("🔄"*30 + "\n")
         
         try:
-            # Step 1: Crawl and store new data
-            self.crawler.crawl_and_store()
+            # Step 1: Crawl and store new data (native thread: SQLite writes don't yield)
+            run_blocking(self.crawler.crawl_and_store)
             
             # Step 2: Check if we have enough data for prediction
-            count = self.db.get_measurement_count()
-            if count >= Config.SEQUENCE_LENGTH:
-                # Step 3: Generate predictions
-                self.predictor.predict_24h()
+            # (early-exit check; only count the table when there isn't enough)
+            if self.db.has_at_least(Config.SEQUENCE_LENGTH):
+                # Step 3: Generate predictions (native thread: CPU-bound inference)
+                run_blocking(self.predictor.predict_24h)
             else:
+                count = self.db.get_measurement_count()
                 print(f"[INFO] Not enough data for prediction: {count}/{Config.SEQUENCE_LENGTH} hours")
         
-        except Exception as e:
-            print(f"[ERROR] Hourly task failed: {e}")
-            import traceback
-            traceback.print_exc()
+        except Exception:
+            logger.exception("Hourly task failed")
+        
+        if self.on_update:
+            self.on_update()
     
     def start(self):
         """Start the hourly scheduler"""
@@ -55,7 +86,8 @@ class HourlyScheduler:
         )
         
         # 2. INTELLIGENT STARTUP CHECK:
-        # If latest data is stale (>1 hour old) or no predictions exist, run immediately.
+        # Skip if this hour's cycle already produced predictions (e.g. a quick restart).
+        # Otherwise run immediately if latest data is stale (>1 hour old) or no predictions exist.
         latest_str = self.db.get_latest_datetime()
         should_run_now = False
         
@@ -63,14 +95,19 @@ class HourlyScheduler:
             should_run_now = True
         else:
             # Check if stale
-            last_time = datetime.strptime(latest_str, '%Y-%m-%d %H:%M')
-            # Localize to match timezone awareness
-            last_time = self.timezone.localize(last_time) if last_time.tzinfo is None else last_time
+            # Attach timezone to match awareness (zoneinfo needs no localize step)
+            last_time = datetime.strptime(latest_str, '%Y-%m-%d %H:%M').replace(tzinfo=self.timezone)
             now = datetime.now(self.timezone)
+            hour_bucket = now.replace(minute=0, second=0, microsecond=0)
             
-            if (now - last_time).total_seconds() > 3600:
+            if self.db.predictions_exist_for(hour_bucket):
+                print(f"[INFO] Predictions already exist for {hour_bucket.strftime('%Y-%m-%d %H:00')}, skipping startup update")
+            elif (now - last_time).total_seconds() > 3600:
                 should_run_now = True
                 print(f"[INFO] Data is stale (Last: {latest_str}). Triggering immediate update...")
+            elif not self.db.get_latest_prediction_time():
+                should_run_now = True
+                print("[INFO] No predictions found. Triggering immediate update...")
 
         self.scheduler.start()
         
@@ -0,0 +1,28 @@
+"""
+Run the hourly crawler + prediction scheduler as its own process.
+Use this when the web app runs with several workers (ENABLE_SCHEDULER=0 on
+those), so the EPA API is polled and the model is loaded exactly once.
+
+Usage:
+    python -m backend.scheduler_worker
+"""
+
+import time
+from backend.database import get_db
+from backend.scheduler import HourlyScheduler
+
+def main():
+    db = get_db()
+    db.init_schema()
+    
+    scheduler = HourlyScheduler(db)
+    scheduler.start()
+    
+    try:
+        while True:
+            time.sleep(60)
+    except (KeyboardInterrupt, SystemExit):
+        scheduler.shutdown()
+
+if __name__ == '__main__':
+    main()
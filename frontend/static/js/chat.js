@@ -17,17 +17,38 @@ async function sendMessage() {
     const loadingBubble = appendMessage('bot', 'Thinking...', true);
 
     try {
-        const response = await fetch('/api/chat', {
+        const response = await fetch('/api/chat/stream', {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({ message: message })
         });
-        
-        const data = await response.json();
 
-        // 3. Remove "Thinking..." and add real response
-        loadingBubble.remove(); 
-        appendMessage('bot', data.response);
+        if (!response.ok) throw new Error(`HTTP ${response.status}`);
+
+        // 3. Replace "Thinking..." with the reply as it streams in
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let botBubble = null;
+        let text = '';
+
+        while (true) {
+            const { done, value } = await reader.read();
+            if (done) break;
+
+            text += decoder.decode(value, { stream: true });
+            if (!botBubble) {
+                loadingBubble.remove();
+                botBubble = appendMessage('bot', text);
+            } else {
+                botBubble.querySelector('.bubble').textContent = text;
+                chatMessages.scrollTop = chatMessages.scrollHeight;
+            }
+        }
+
+        if (!botBubble) {
+            loadingBubble.remove();
+            appendMessage('bot', text);
+        }
 
     } catch (error) {
         loadingBubble.remove();